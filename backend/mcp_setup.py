@@ -0,0 +1,38 @@
+import logging
+from pathlib import Path
+from langchain_google_genai import ChatGoogleGenerativeAI
+from mcp_use import MCPAgent, MCPClient
+
+# System prompt shared by every agent instance, read once at import
+SYSTEM_PROMPT = (Path(__file__).parent / "prompts" / "system.md").read_text(encoding="utf-8").strip()
+
+def build_agent(mcp_server_url: str) -> tuple[MCPClient, ChatGoogleGenerativeAI, MCPAgent]:
+    """Create the MCP client, LLM and agent for the given MCP server URL"""
+    # Create configuration dictionary
+    config = {
+        "mcpServers": {
+            "splitwise": {
+                "url": mcp_server_url
+            }
+        }
+    }
+
+    # Create MCPClient from configuration dictionary
+    client = MCPClient.from_dict(config)
+    logging.info("MCP Client initialized")
+
+    # Create LLM
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        temperature=0,
+        max_tokens=None,
+        timeout=None,
+        max_retries=2,
+    )
+    logging.info("LLM initialized")
+
+    # Create agent with the client
+    agent = MCPAgent(llm=llm, client=client, max_steps=30, system_prompt=SYSTEM_PROMPT)
+    logging.info("Agent initialized")
+
+    return client, llm, agent
@@ -1,11 +1,16 @@
 import asyncio
+import hashlib
 import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from mcp_use import MCPAgent, MCPClient
+from mcp_setup import build_agent
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import orjson
 import uvicorn
 import logging
 
@@ -22,8 +27,21 @@ mcp_server_url = os.getenv("MCP_SERVER_URL")
 if not mcp_server_url:
     raise ValueError("MCP_SERVER_URL environment variable is required")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize MCP client and agent on startup, close MCP sessions on shutdown"""
+    await initialize_mcp()
+    yield
+    if client is not None:
+        await client.close_all_sessions()
+
 # Create FastAPI app
-app = FastAPI(title="MCP Financial Assistant API", version="1.0.0")
+app = FastAPI(
+    title="MCP Financial Assistant API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
@@ -39,72 +57,180 @@ class QueryRequest(BaseModel):
     query: str
     chat_history: list = []  # List of previous messages
     browser_id: str | None = None
+    summary: str | None = None  # Rolling summary of messages older than the recent window
+    summary_count: int = 0  # Number of chat_history messages already folded into summary
 
 # Pydantic model for response
 class QueryResponse(BaseModel):
     result: str
     success: bool
     error: str | None = None
+    summary: str | None = None
+    summary_count: int = 0
 
-# Global variables for client and agent
+# Global variables for client, agent and LLM
 client = None
 agent = None
+llm = None
+agent_ready = False  # True once MCP sessions and tool schemas are loaded
+
+# Number of most recent chat messages sent verbatim; older ones are folded into a summary
+RECENT_HISTORY_SIZE = 10
+
+SUMMARY_PROMPT = """Summarize the prior conversation between a user and a financial assistant in at most 150 tokens.
+Preserve names, groups, amounts and any open tasks or unanswered questions.
+
+Previous summary:
+{summary}
+
+New messages:
+{messages}"""
+
+# Exact-match cache of agent results, keyed on browser_id + normalized query.
+# Opt-in (QUERY_CACHE_TTL defaults to 0) since Splitwise balances change, and only
+# turns that ran read-only tools without failures are stored.
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "0"))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+query_cache: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+# MCP tools that never change Splitwise or local state; replaying an answer built
+# from anything else would repeat a write confirmation that never happened again
+READ_ONLY_TOOLS = frozenset({
+    "get_current_user", "get_user", "get_groups", "get_group", "get_friends", "get_friend",
+    "get_expense", "get_expenses", "get_comments", "get_expenses_comments", "get_notifications",
+    "get_currencies", "get_categories", "get_currency", "get_category", "get_dashboard", "greet",
+})
+
+def query_cache_key(browser_id: str | None, full_query: str) -> str:
+    """Hash the whitespace/case-normalized query together with the browser_id"""
+    normalized = " ".join(full_query.split()).casefold()
+    return hashlib.sha256(f"{browser_id}\n{normalized}".encode()).hexdigest()
+
+def get_cached_result(key: str) -> str | None:
+    """Return a cached agent result if present and not expired"""
+    entry = query_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, result = entry
+    if expires_at < time.monotonic():
+        del query_cache[key]
+        return None
+    query_cache.move_to_end(key)
+    return result
+
+def is_cacheable_turn(steps: list) -> bool:
+    """Check that every tool call in an agent turn was read-only and did not fail"""
+    for action, observation in steps:
+        if action.tool not in READ_ONLY_TOOLS:
+            return False
+        try:
+            payload = orjson.loads(observation)
+        except (orjson.JSONDecodeError, TypeError):
+            continue
+        # Failed calls include login prompts, which must not outlive the login
+        if isinstance(payload, dict) and payload.get("status") == "fail":
+            return False
+    return True
+
+def set_cached_result(key: str, result: str) -> None:
+    """Store an agent result, evicting the least recently used entries"""
+    if QUERY_CACHE_TTL <= 0:
+        return
+    query_cache[key] = (time.monotonic() + QUERY_CACHE_TTL, result)
+    query_cache.move_to_end(key)
+    while len(query_cache) > QUERY_CACHE_SIZE:
+        query_cache.popitem(last=False)
 
 async def initialize_mcp():
     """Initialize MCP client and agent"""
-    global client, agent
-    
-    # Create configuration dictionary
-    config = {
-        "mcpServers": {
-            "splitwise": {
-                "url": mcp_server_url
-            }
-        }
-    }
+    global client, agent, llm, agent_ready
+    client, llm, agent = build_agent(mcp_server_url)
+
+    # Warm up: open the MCP session and fetch tool schemas now so the first
+    # query doesn't pay for discovery. If the MCP server isn't up yet, the
+    # agent falls back to initializing lazily on its first run.
+    try:
+        await agent.initialize()
+        agent_ready = True
+        logging.info("Agent warm-up complete")
+    except Exception:
+        logging.exception("Agent warm-up failed; will initialize on first query")
+
+def format_messages(messages: list) -> str:
+    """Render chat history entries as 'User:'/'Assistant:' transcript lines"""
+    parts = []
+    append = parts.append
+    for i, msg in enumerate(messages):
+        if type(msg) is not dict:
+            append(f"Message {i+1}: {msg}\n")
+            continue
+        user_msg = msg.get('user')
+        if user_msg is not None:
+            append(f"User: {user_msg}\n")
+            continue
+        server_msg = msg.get('server')
+        if server_msg is not None:
+            append(f"Assistant: {server_msg}\n")
+    return "".join(parts)
 
-    # Create MCPClient from configuration dictionary
-    client = MCPClient.from_dict(config)
-    logging.info("MCP Client initialized")
-
-    # Create LLM
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0,
-        max_tokens=None,
-        timeout=None,
-        max_retries=2,
+def build_context(chat_history: list, summary: str | None) -> str:
+    """Build the query context from the rolling summary and the recent chat window"""
+    if not chat_history:
+        return ""
+    parts = []
+    if summary:
+        parts.append(f"Summary of earlier conversation: {summary}\n\n")
+    parts.append("Recent conversation:\n")
+    parts.append(format_messages(chat_history[-RECENT_HISTORY_SIZE:]))
+    parts.append("\nCurrent query: ")
+    return "".join(parts)
+
+async def update_summary(chat_history: list, summary: str | None, summary_count: int) -> tuple[str | None, int]:
+    """Fold messages that slid out of the recent window into the rolling summary.
+
+    Only the messages not yet covered by summary are sent to the LLM, so the cost
+    per turn stays bounded no matter how long the conversation gets.
+    """
+    if summary_count > len(chat_history):
+        # History was cleared or replaced on the client; start over
+        summary, summary_count = None, 0
+    cutoff = len(chat_history) - RECENT_HISTORY_SIZE
+    if cutoff <= summary_count:
+        return summary, summary_count
+    prompt = SUMMARY_PROMPT.format(
+        summary=summary or "(none)",
+        messages=format_messages(chat_history[summary_count:cutoff]),
     )
-    logging.info("LLM initialized")
-
-    # Define system prompt
-    system_prompt = """You are a helpful financial assistant and general-purpose assistant.
-
-Guidelines:
-1. For general queries, answer naturally and helpfully, just like a friendly assistant. Do not mention Splitwise unless the user asks about it or about expenses, groups, or friends.
-2. If the user asks about Splitwise, call the appropriate Splitwise tool (such as get_current_user) directly, using the information provided by the application. Do not ask the user for any internal variables or IDs.
-3. NEVER mention or ask for internal variables, IDs, or technical details such as 'browser_id' or any implementation details. Do not instruct the user to look for such variables.
-4. If a Splitwise tool returns a login link, always send it to the frontend as a clearly marked clickable link, e.g., 'Login Link: https://...'.
-5. If there is no browser_id in the query, politely ask the user to reload the page to continue instaed of assuming.
-6. ALWAYS return human-readable names instead of IDs (user names, group names, expense names, etc.)
-7. NEVER return raw IDs, user IDs, group IDs, or any technical identifiers
-8. Provide brief analysis and insights with your results, not just bare data
-9. Format your responses in a clear, organized manner
-10. When showing balances or debts, explain what the numbers mean in simple terms
-11. Use friendly, conversational language while being informative
-12. Remember previous conversation context and refer back to it when relevant
-13. If the user asks follow-up questions, use the context from previous messages to provide more relevant answers
-
-Remember: Only mention Splitwise if the user asks about it or about expenses, groups, or friends. Never expose internal implementation details. Always prioritize names over IDs and provide context with your analysis. Use the conversation history to provide more personalized and contextual responses."""
-
-    # Create agent with the client
-    agent = MCPAgent(llm=llm, client=client, max_steps=30, system_prompt=system_prompt)
-    logging.info("Agent initialized")
-
-@app.on_event("startup")
-async def startup_event():
-    """Initialize MCP client and agent on startup"""
-    await initialize_mcp()
+    try:
+        response = await llm.ainvoke(prompt)
+    except Exception:
+        logging.exception("Error summarizing chat history")
+        return summary, summary_count
+    return response.content, cutoff
+
+async def prepare_query(request: QueryRequest) -> tuple[str, str, str | None, int]:
+    """Build the agent input for a request.
+
+    Returns the contextualized query, the same query tagged with the browser_id
+    for the agent, and the updated rolling summary and its message count.
+    """
+    # Extract browser_id from request if present
+    browser_id = getattr(request, 'browser_id', None)
+    logging.info(f"browser_id: {browser_id}")
+    # Build context from the rolling summary plus the last few messages
+    summary, summary_count = await update_summary(
+        request.chat_history, request.summary, request.summary_count
+    )
+    context = build_context(request.chat_history, summary)
+    
+    # Combine context with current query
+    full_query = context + request.query if context else request.query
+    full_query_with_id = f"[browser_id: {browser_id}]\n{full_query}" if browser_id else full_query
+    return full_query, full_query_with_id, summary, summary_count
+
+def sse_event(payload: dict) -> bytes:
+    """Encode a payload as a single Server-Sent Events data frame"""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
 
 @app.get("/")
 async def root():
@@ -118,50 +244,27 @@ async def process_query(request: QueryRequest):
         if agent is None:
             raise HTTPException(status_code=500, detail="Agent not initialized")
         
-        # Extract browser_id from request if present
-        browser_id = getattr(request, 'browser_id', None)
-        logging.info(f"browser_id: {browser_id}")
-        # Build context from chat history (limit to last 10 messages to prevent token overflow)
-        context = ""
-        if request.chat_history:
-            # Take only the last 10 messages to manage context length
-            recent_history = request.chat_history[-10:]
-            
-            # If we have more than 10 messages, create a summary of earlier conversation
-            if len(request.chat_history) > 10:
-                earlier_messages = request.chat_history[:-10]
-                user_topics = []
-                for msg in earlier_messages:
-                    if isinstance(msg, dict) and 'user' in msg:
-                        user_topics.append(msg['user'][:100])  # First 100 chars of each user message
-                
-                context = f"Earlier conversation covered: {', '.join(user_topics[:5])}...\n\n"
-            
-            context += "Recent conversation:\n"
-            for i, msg in enumerate(recent_history):
-                if isinstance(msg, dict):
-                    if 'user' in msg:
-                        context += f"User: {msg['user']}\n"
-                    elif 'server' in msg:
-                        # Truncate long assistant responses to keep context manageable
-                        assistant_msg = msg['server']
-                        if len(assistant_msg) > 500:
-                            assistant_msg = assistant_msg[:500] + "..."
-                        context += f"Assistant: {assistant_msg}\n"
-                else:
-                    context += f"Message {i+1}: {msg}\n"
-            context += "\nCurrent query: "
-        
-        # Combine context with current query
-        full_query = context + request.query if context else request.query
+        full_query, full_query_with_id, summary, summary_count = await prepare_query(request)
         
         # Run the query with full context
-        full_query_with_id = f"[browser_id: {browser_id}]\n{full_query}" if browser_id else full_query
-        result = await agent.run(full_query_with_id)
+        cache_key = query_cache_key(request.browser_id, full_query)
+        result = get_cached_result(cache_key)
+        if result is None:
+            # Stream instead of agent.run so the turn's tool calls can be inspected
+            steps = []
+            async for item in agent.stream(full_query_with_id):
+                if isinstance(item, str):
+                    result = item
+                else:
+                    steps.append(item)
+            if is_cacheable_turn(steps):
+                set_cached_result(cache_key, result)
         
         return QueryResponse(
             result=result,
-            success=True
+            success=True,
+            summary=summary,
+            summary_count=summary_count
         )
     
     except Exception as e:
@@ -172,12 +275,39 @@ async def process_query(request: QueryRequest):
             error=str(e)
         )
 
+@app.post("/query/stream")
+async def process_query_stream(request: QueryRequest):
+    """Process a query like /query, streaming the answer as Server-Sent Events.
+
+    Emits {"delta": ...} frames as the LLM generates text, then a final
+    {"done": true, "summary": ..., "summary_count": ...} frame, or {"error": ...}.
+    """
+    if agent is None:
+        raise HTTPException(status_code=500, detail="Agent not initialized")
+    full_query, full_query_with_id, summary, summary_count = await prepare_query(request)
+
+    async def event_stream():
+        try:
+            async for event in agent.stream_events(full_query_with_id):
+                if event.get("event") != "on_chat_model_stream":
+                    continue
+                content = event["data"]["chunk"].content
+                if isinstance(content, str) and content:
+                    yield sse_event({"delta": content})
+            yield sse_event({"done": True, "summary": summary, "summary_count": summary_count})
+        except Exception as e:
+            logging.exception("Error streaming query")
+            yield sse_event({"error": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
         "agent_initialized": agent is not None,
+        "agent_ready": agent_ready,
         "client_initialized": client is not None
     }
 
@@ -185,33 +315,9 @@ async def health_check():
 async def debug_context(request: QueryRequest):
     """Debug endpoint to see how context is being built"""
     try:
-        # Build context from chat history (same logic as main endpoint)
-        context = ""
-        if request.chat_history:
-            recent_history = request.chat_history[-10:]
-            
-            if len(request.chat_history) > 10:
-                earlier_messages = request.chat_history[:-10]
-                user_topics = []
-                for msg in earlier_messages:
-                    if isinstance(msg, dict) and 'user' in msg:
-                        user_topics.append(msg['user'][:100])
-                
-                context = f"Earlier conversation covered: {', '.join(user_topics[:5])}...\n\n"
-            
-            context += "Recent conversation:\n"
-            for i, msg in enumerate(recent_history):
-                if isinstance(msg, dict):
-                    if 'user' in msg:
-                        context += f"User: {msg['user']}\n"
-                    elif 'server' in msg:
-                        assistant_msg = msg['server']
-                        if len(assistant_msg) > 500:
-                            assistant_msg = assistant_msg[:500] + "..."
-                        context += f"Assistant: {assistant_msg}\n"
-                else:
-                    context += f"Message {i+1}: {msg}\n"
-            context += "\nCurrent query: "
+        # Build context from chat history (same logic as main endpoint, using the
+        # summary supplied by the client rather than generating a new one)
+        context = build_context(request.chat_history, request.summary)
         
         full_query = context + request.query if context else request.query
         
@@ -228,4 +334,15 @@ async def debug_context(request: QueryRequest):
         return {"error": str(e)}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "80")))
+    # Each worker is a separate process with its own MCP client and agent
+    # (initialized in the lifespan handler). loop/http stay on "auto" so uvloop and
+    # httptools are used when installed, without breaking platforms lacking them.
+    uvicorn.run(
+        "server:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "80")),
+        workers=int(os.getenv("UVICORN_WORKERS", "4")),
+        loop="auto",
+        http="auto",
+        access_log=False,
+    )
@@ -15,6 +15,9 @@ export default function App() {
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
   const [showContextInfo, setShowContextInfo] = useState(false);
+  // Rolling summary of older messages, maintained by the backend
+  const [summary, setSummary] = useState(null);
+  const [summaryCount, setSummaryCount] = useState(0);
   const chatEndRef = useRef(null);
 
   // Browser ID state (persistent across browser restarts)
@@ -54,7 +57,9 @@ export default function App() {
         body: JSON.stringify({ 
           query: input,
           chat_history: chatContext,
-          browser_id: browserId // <-- send browser ID with every call
+          browser_id: browserId, // <-- send browser ID with every call
+          summary: summary,
+          summary_count: summaryCount
         }),
       });
       
@@ -65,6 +70,8 @@ export default function App() {
       const data = await res.json();
       
       if (data.success) {
+        setSummary(data.summary);
+        setSummaryCount(data.summary_count);
         setChatHistory([
           ...newHistory,
           { server: data.result, type: "markdown" },
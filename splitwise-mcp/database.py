@@ -1,38 +1,161 @@
-import sqlite3
-import os
-from typing import Optional, Dict, Any
-from datetime import datetime
+import aiosqlite
+import asyncio
+import functools
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, Iterable, AsyncIterator, Tuple
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured by the application; a library module shouldn't touch the root logger
 logger = logging.getLogger(__name__)
 
+# Cached in place of user data for browser IDs that aren't in the database
+_MISS = object()
+
 class UserDatabase:
-    def __init__(self, db_path: str = "users.db"):
+    # SQL is kept in constants so the same string objects hit the connection's
+    # prepared-statement cache on every call
+    _SQL_GET = 'SELECT splitwise_user_id, access_token FROM users WHERE browser_id = ?'
+    # Timestamps are bound as integer epoch seconds (?4 fills both columns)
+    _SQL_PUT = '''
+        INSERT INTO users (browser_id, splitwise_user_id, access_token, created_at, updated_at)
+        VALUES (?1, ?2, ?3, ?4, ?4)
+        ON CONFLICT(browser_id) DO UPDATE SET
+            splitwise_user_id = excluded.splitwise_user_id,
+            access_token = excluded.access_token,
+            updated_at = excluded.updated_at
+    '''
+    _SQL_DEL = 'DELETE FROM users WHERE browser_id = ?'
+    _SQL_EXISTS = 'SELECT 1 FROM users WHERE browser_id = ? LIMIT 1'
+    # WITHOUT ROWID stores rows in the primary-key b-tree itself, so a lookup by
+    # browser_id is one b-tree descent instead of PK index -> rowid -> row.
+    # Tokens are stored as BLOB so SQLite skips text encoding on bind and fetch.
+    _SQL_CREATE = '''
+        CREATE TABLE IF NOT EXISTS {table} (
+            browser_id TEXT PRIMARY KEY,
+            splitwise_user_id INTEGER NOT NULL,
+            access_token BLOB NOT NULL,
+            created_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now')),
+            updated_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+        ) WITHOUT ROWID
+    '''
+    # Fragments of the current CREATE statement; a stored schema missing any of them is migrated
+    _SCHEMA_MARKERS = ('WITHOUT ROWID', 'ACCESS_TOKEN BLOB', 'CREATED_AT INTEGER', 'UPDATED_AT INTEGER')
+
+    def __init__(self, db_path: str = "users.db", cache_ttl: float = 60.0, cache_size: int = 10_000,
+                 readers: int = 4, miss_ttl: float = 5.0):
         self.db_path = db_path
-        self.init_database()
+        # browser_id -> (expires_at, user data or _MISS); saves and deletes invalidate entries.
+        # Misses are cached briefly so repeated unknown IDs don't each cost a query.
+        self._cache: Dict[str, tuple] = {}
+        self._cache_ttl = cache_ttl
+        self._miss_ttl = miss_ttl
+        self._cache_size = cache_size
+        # Bumped on every write so a read that raced a write doesn't cache stale data
+        self._write_gen = 0
+        # WAL allows one writer alongside many readers: a single write connection
+        # guarded by self._write_lock, plus a pool of read-only connections so
+        # concurrent lookups don't queue behind each other. Each aiosqlite
+        # connection runs its queries on its own thread, so none of them block
+        # the event loop. Connections are opened on first use by open().
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: "asyncio.Queue[aiosqlite.Connection]" = asyncio.Queue()
+        self._reader_count = readers
+        self._open_lock = asyncio.Lock()
+        self._opened = False
+    
+    async def open(self):
+        """Open the writer and reader connections and initialize the schema. Safe to call repeatedly."""
+        if self._opened:
+            return
+        async with self._open_lock:
+            if self._opened:
+                return
+            self._writer = await aiosqlite.connect(self.db_path, isolation_level=None, cached_statements=128)
+            try:
+                await self.init_database()
+                
+                for _ in range(self._reader_count):
+                    reader = await aiosqlite.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                                                     isolation_level=None, cached_statements=128)
+                    self._readers.put_nowait(reader)
+                    await reader.execute('PRAGMA query_only=ON')
+                    await reader.execute('PRAGMA cache_size=-16000')
+                    await reader.execute('PRAGMA mmap_size=268435456')
+            except BaseException:
+                # Don't leak connections (and their worker threads) when setup fails
+                while not self._readers.empty():
+                    await self._readers.get_nowait().close()
+                await self._writer.close()
+                self._writer = None
+                raise
+            self._opened = True
+    
+    async def close(self):
+        """Close all connections; aiosqlite's worker threads keep the process alive until then."""
+        async with self._open_lock:
+            while not self._readers.empty():
+                await self._readers.get_nowait().close()
+            if self._writer is not None:
+                await self._writer.close()
+                self._writer = None
+            self._opened = False
     
-    def init_database(self):
+    @asynccontextmanager
+    async def _reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool, waiting until one is free."""
+        await self.open()
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+    
+    async def init_database(self):
         """Initialize the database with the users table if it doesn't exist."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create users table with browser_id as primary key
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                browser_id TEXT PRIMARY KEY,
-                splitwise_user_id INTEGER NOT NULL,
-                access_token TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        async with self._write_lock:
+            # WAL lets readers proceed during writes and avoids a rollback-journal
+            # fsync per commit; NORMAL sync is durable across app crashes in WAL mode
+            await self._writer.execute('PRAGMA journal_mode=WAL')
+            await self._writer.execute('PRAGMA synchronous=NORMAL')
+            await self._writer.execute('PRAGMA temp_store=MEMORY')
+            await self._writer.execute('PRAGMA cache_size=-64000')
+            await self._writer.execute('PRAGMA mmap_size=268435456')
+            
+            async with self._writer.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+            ) as cursor:
+                row = await cursor.fetchone()
+            # Warm starts find the table already there and skip the DDL
+            if row is None:
+                # Create users table with browser_id as primary key
+                await self._writer.execute(self._SQL_CREATE.format(table='users'))
+            elif any(marker not in row[0].upper() for marker in self._SCHEMA_MARKERS):
+                await self._migrate_users_table()
+    
+    async def _migrate_users_table(self):
+        """Rebuild a users table created with an older schema. Caller holds the write lock."""
+        logger.info("Migrating users table to the current schema")
+        await self._writer.execute('BEGIN IMMEDIATE')
+        try:
+            await self._writer.execute('DROP TABLE IF EXISTS users_new')
+            await self._writer.execute(self._SQL_CREATE.format(table='users_new'))
+            await self._writer.execute('''
+                INSERT INTO users_new (browser_id, splitwise_user_id, access_token, created_at, updated_at)
+                SELECT browser_id, splitwise_user_id, CAST(access_token AS BLOB),
+                       COALESCE(CAST(strftime('%s', created_at) AS INTEGER), strftime('%s', 'now')),
+                       COALESCE(CAST(strftime('%s', updated_at) AS INTEGER), strftime('%s', 'now'))
+                FROM users
+            ''')
+            await self._writer.execute('DROP TABLE users')
+            await self._writer.execute('ALTER TABLE users_new RENAME TO users')
+            await self._writer.execute('COMMIT')
+        except Exception:
+            await self._writer.execute('ROLLBACK')
+            raise
     
-    def get_user_token_and_splitwise_id(self, browser_id: str) -> Optional[Dict[str, Any]]:
+    async def get_user_token_and_splitwise_id(self, browser_id: str) -> Optional[Dict[str, Any]]:
         """Get the splitwise_user_id and access token for a browser from the database.
         
         Args:
@@ -41,20 +164,36 @@ class UserDatabase:
         Returns:
             Dict with splitwise_user_id and access_token if found, None otherwise
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT splitwise_user_id, access_token FROM users WHERE browser_id = ?', (browser_id,))
-        result = cursor.fetchone()
+        entry = self._cache.get(browser_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return None if entry[1] is _MISS else entry[1]
         
-        conn.close()
+        gen = self._write_gen
+        async with self._reader() as conn:
+            async with conn.execute(self._SQL_GET, (browser_id,)) as cursor:
+                result = await cursor.fetchone()
         
         if result:
-            return {"splitwise_user_id": result[0], "access_token": result[1]}
+            token = result[1]
+            # Rows written before the BLOB column keep their TEXT values
+            if type(token) is bytes:
+                token = token.decode("utf-8")
+            user_data = {"splitwise_user_id": result[0], "access_token": token}
+            self._cache_put(browser_id, gen, user_data, self._cache_ttl)
+            return user_data
         else:
+            self._cache_put(browser_id, gen, _MISS, self._miss_ttl)
             return None
     
-    def save_user_token(self, browser_id: str, splitwise_user_id: int, access_token: str) -> bool:
+    def _cache_put(self, browser_id: str, gen: int, value: Any, ttl: float):
+        """Cache a lookup result unless a save/delete landed while it was being read."""
+        if gen != self._write_gen:
+            return
+        if len(self._cache) >= self._cache_size:
+            self._cache.pop(next(iter(self._cache)), None)
+        self._cache[browser_id] = (time.monotonic() + ttl, value)
+    
+    async def save_user_token(self, browser_id: str, splitwise_user_id: int, access_token: str) -> bool:
         """Save or update a browser's splitwise_user_id and access token in the database.
         
         Args:
@@ -66,23 +205,51 @@ class UserDatabase:
             True if successful, False otherwise
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Use INSERT OR REPLACE to handle both new users and updates
-            cursor.execute('''
-                INSERT OR REPLACE INTO users (browser_id, splitwise_user_id, access_token, updated_at)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-            ''', (browser_id, splitwise_user_id, access_token))
+            await self.open()
+            async with self._write_lock:
+                # Upsert updates existing rows in place, preserving created_at
+                await self._writer.execute(
+                    self._SQL_PUT, (browser_id, splitwise_user_id, access_token.encode("utf-8"), int(time.time()))
+                )
+                self._write_gen += 1
+                self._cache.pop(browser_id, None)
+            return True
+        except Exception:
+            logger.error("Error saving user token for browser_id=%s", browser_id, exc_info=True)
+            return False
+    
+    async def save_user_tokens(self, rows: Iterable[Tuple[str, int, str]]) -> bool:
+        """Save or update many browsers' tokens in a single transaction.
+        
+        Args:
+            rows: (browser_id, splitwise_user_id, access_token) tuples
             
-            conn.commit()
-            conn.close()
+        Returns:
+            True if successful, False otherwise
+        """
+        now = int(time.time())
+        rows = [(browser_id, splitwise_user_id, access_token.encode("utf-8"), now)
+                for browser_id, splitwise_user_id, access_token in rows]
+        try:
+            await self.open()
+            async with self._write_lock:
+                # One transaction means one commit for the whole batch instead of one per row
+                await self._writer.execute('BEGIN')
+                try:
+                    await self._writer.executemany(self._SQL_PUT, rows)
+                    await self._writer.execute('COMMIT')
+                except Exception:
+                    await self._writer.execute('ROLLBACK')
+                    raise
+                self._write_gen += 1
+                for row in rows:
+                    self._cache.pop(row[0], None)
             return True
-        except Exception as e:
-            logger.error(f"Error saving user token: {e}")
+        except Exception:
+            logger.error("Error saving %d user tokens", len(rows), exc_info=True)
             return False
     
-    def delete_user_token(self, browser_id: str) -> bool:
+    async def delete_user_token(self, browser_id: str) -> bool:
         """Delete a browser's access token from the database.
         
         Args:
@@ -92,19 +259,17 @@ class UserDatabase:
             True if successful, False otherwise
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('DELETE FROM users WHERE browser_id = ?', (browser_id,))
-            
-            conn.commit()
-            conn.close()
+            await self.open()
+            async with self._write_lock:
+                await self._writer.execute(self._SQL_DEL, (browser_id,))
+                self._write_gen += 1
+                self._cache.pop(browser_id, None)
             return True
-        except Exception as e:
-            logger.error(f"Error deleting user token: {e}")
+        except Exception:
+            logger.error("Error deleting user token for browser_id=%s", browser_id, exc_info=True)
             return False
     
-    def user_exists(self, browser_id: str) -> bool:
+    async def user_exists(self, browser_id: str) -> bool:
         """Check if a browser exists in the database.
         
         Args:
@@ -113,7 +278,20 @@ class UserDatabase:
         Returns:
             True if browser exists, False otherwise
         """
-        return self.get_user_token_and_splitwise_id(browser_id) is not None
+        entry = self._cache.get(browser_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1] is not _MISS
+        
+        # Existence only needs a constant column, not the token itself
+        gen = self._write_gen
+        async with self._reader() as conn:
+            async with conn.execute(self._SQL_EXISTS, (browser_id,)) as cursor:
+                exists = await cursor.fetchone() is not None
+        if not exists:
+            self._cache_put(browser_id, gen, _MISS, self._miss_ttl)
+        return exists
 
-# Global database instance
-db = UserDatabase() 
\ No newline at end of file
+@functools.lru_cache(maxsize=1)
+def get_db() -> UserDatabase:
+    """Return the shared database instance; its connections open on first use."""
+    return UserDatabase()
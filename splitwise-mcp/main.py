@@ -1,13 +1,25 @@
+import asyncio
+import functools
 import os
+import time
+from collections import OrderedDict
 from fastmcp import FastMCP
-import requests
+import httpx
+import orjson
+from pydantic import ValidationError
 from typing import Optional, List, Dict, Any
 from dotenv import load_dotenv
-from database import db
+from database import get_db
 from fastapi import Request
 from fastapi.responses import JSONResponse, HTMLResponse, Response
 import logging
 
+try:
+    # Faster event loop from uvicorn[standard]; it isn't available on Windows
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Load environment variables
 load_dotenv()
 
@@ -34,23 +46,391 @@ The API uses a personal access token for authentication and supports both equal
 
 # Get configuration from environment variables
 base_url = os.getenv("SPLITWISE_BASE_URL", "https://secure.splitwise.com/api/v3.0")
+token_url = "https://secure.splitwise.com/oauth/token"
+consumer_key = os.getenv("SPLITWISE_CONSUMER_KEY")
+consumer_secret = os.getenv("SPLITWISE_CONSUMER_SECRET")
+redirect_uri = os.getenv("REDIRECT_URI")
+# Everything but the state parameter is fixed, so the login URL is built once
+auth_url_prefix = (
+    f"https://secure.splitwise.com/oauth/authorize?client_id={consumer_key}"
+    f"&response_type=code&redirect_uri={redirect_uri}&state="
+)
+
+class TokenBucket:
+    """Async token bucket allowing `rate` requests per second with bursts of up to `capacity`"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        # A bucket smaller than one token could never grant a request
+        self.capacity = max(1.0, capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so requests are released in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+    
+    def pause(self, seconds: float) -> None:
+        """Hold back all requests for `seconds`, e.g. after a 429 with Retry-After"""
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+# Client-side throttle so concurrent tools and batch_execute don't trip Splitwise's rate
+# limit and turn into a 429 storm
+SPLITWISE_RPS = float(os.getenv("SPLITWISE_RPS", "10"))
+if SPLITWISE_RPS <= 0:
+    raise ValueError(f"SPLITWISE_RPS must be greater than 0, got {SPLITWISE_RPS}")
+rate_limiter = TokenBucket(SPLITWISE_RPS)
+
+async def observe_rate_limit(response: httpx.Response) -> None:
+    if response.status_code == 429:
+        retry_after = response.headers.get("Retry-After", "")
+        rate_limiter.pause(float(retry_after) if retry_after.isdigit() else 1.0)
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """Retries safe requests on transient Splitwise errors and fails fast while Splitwise is down.
+    
+    GETs, and writes marked with the "idempotent" request extension, are retried with exponential
+    backoff on 502/503/504 and transport errors; other writes are sent once so an expense is
+    never created twice. Every attempt, retries included, first takes a token from `limiter`.
+    After `fail_max` consecutive failures the circuit opens and requests get an immediate 503
+    for `reset_timeout` seconds instead of tying up pooled connections; after that a single
+    probe request is let through to decide whether it closes again, while the rest keep
+    getting the 503 until it does.
+    """
+    RETRY_STATUSES = frozenset((502, 503, 504))
+    
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: Optional[TokenBucket] = None,
+                 retries: int = 2, backoff: float = 0.3, fail_max: int = 10, reset_timeout: float = 30.0):
+        self._transport = transport
+        self._limiter = limiter
+        self._retries = retries
+        self._backoff = backoff
+        self._fail_max = fail_max
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        probe = False
+        if self._failures >= self._fail_max:
+            if self._probing or time.monotonic() < self._open_until:
+                return httpx.Response(503, json={"error": "Splitwise is unavailable, try again shortly"}, request=request)
+            probe = self._probing = True
+        try:
+            return await self._send(request)
+        finally:
+            if probe:
+                self._probing = False
+    
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        retryable = request.method == "GET" or request.extensions.get("idempotent", False)
+        attempts = 1 + (self._retries if retryable else 0)
+        for attempt in range(attempts):
+            if self._limiter is not None:
+                await self._limiter.acquire()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError:
+                self._record_failure()
+                if attempt + 1 == attempts:
+                    raise
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    self._failures = 0
+                    return response
+                self._record_failure()
+                if attempt + 1 == attempts:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(self._backoff * 2 ** attempt)
+    
+    def _record_failure(self) -> None:
+        self._failures += 1
+        if self._failures >= self._fail_max:
+            self._open_until = time.monotonic() + self._reset_timeout
+    
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+# Shared async client: tool calls await Splitwise without blocking the event loop, and
+# concurrent calls are multiplexed over pooled HTTP/2 connections instead of paying a
+# TCP + TLS handshake each time. Auth stays per call since tokens are per user.
+# The transport retries failed connection attempts, and ResilientTransport retries reads on 5xx.
+# Collection responses are large, repetitive JSON; br needs the brotli package (httpx[brotli]).
+http_client = httpx.AsyncClient(
+    base_url=base_url,
+    headers={
+        "Accept": "application/json",
+        "Accept-Encoding": "br, gzip, deflate",
+        "User-Agent": "splitwise-mcp/1.0",
+    },
+    timeout=30.0,
+    event_hooks={"response": [observe_rate_limit]},
+    # Throttled in the transport rather than a request hook so retries also wait for a token
+    transport=ResilientTransport(httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+        retries=3,
+    ), limiter=rate_limiter),
+)
+
+# Short-lived cache for read-only tools, keyed on (tool, arguments) and therefore per browser.
+# Any write that can change users, groups, friends, balances or comments clears it.
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+response_cache: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+# Calls currently running per cache key; identical concurrent calls share one request
+inflight_calls: Dict[tuple, asyncio.Task] = {}
+# Bumped by every write so a read that overlapped a write is neither shared nor cached
+cache_generation = 0
 
-def get_headers(access_token: str) -> dict:
-    return {
-        "Authorization": f"Bearer {access_token}"
+def cached_tool(ttl: float = RESPONSE_CACHE_TTL, bypass: Optional[str] = None):
+    """Cache successful results of a read-only tool for ttl seconds.
+    
+    Calls where the keyword argument named by `bypass` is truthy skip the cache and drop the
+    entry they would otherwise have been served from.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = (fn.__name__, args, tuple(sorted(item for item in kwargs.items() if item[0] != bypass)))
+            if bypass is not None and kwargs.get(bypass):
+                response_cache.pop(key, None)
+                return await fn(*args, **kwargs)
+            entry = response_cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                response_cache.move_to_end(key)
+                return entry[1]
+            task = inflight_calls.get(key)
+            if task is None:
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+                inflight_calls[key] = task
+                task.add_done_callback(
+                    lambda done: inflight_calls.pop(key) if inflight_calls.get(key) is done else None
+                )
+            gen = cache_generation
+            # Shielded so one caller being cancelled doesn't cancel the call for the others
+            result = await asyncio.shield(task)
+            # Login prompts and Splitwise errors must not be replayed
+            if ttl > 0 and gen == cache_generation and isinstance(result, dict) and result.get("status") != "fail" and not result.get("errors"):
+                response_cache[key] = (time.monotonic() + ttl, result)
+                response_cache.move_to_end(key)
+                while len(response_cache) > RESPONSE_CACHE_SIZE:
+                    response_cache.popitem(last=False)
+            return result
+        return wrapper
+    return decorator
+
+def invalidate_response_cache() -> None:
+    """Drop cached and in-flight read results after a write"""
+    global cache_generation
+    cache_generation += 1
+    response_cache.clear()
+    inflight_calls.clear()
+
+def invalidates_cache(fn):
+    """Clear the read-only tool cache after a write tool runs"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            invalidate_response_cache()
+    return wrapper
+
+# Nested resources (users, friends) are sent as JSON arrays. Set SPLITWISE_FLAT_NESTED_PARAMS=1
+# to fall back to the flattened users__0__user_id form from the API docs.
+FLAT_NESTED_PARAMS = os.getenv("SPLITWISE_FLAT_NESTED_PARAMS", "").lower() in ("1", "true", "yes")
+
+def add_nested_param(data: dict, name: str, items: List[Dict[str, Any]]) -> None:
+    """Add a list of nested objects to a request payload"""
+    if FLAT_NESTED_PARAMS:
+        data.update({f"{name}__{i}__{key}": value for i, item in enumerate(items) for key, value in item.items()})
+    else:
+        data[name] = items
+
+def equal_split_payload(
+    description: str,
+    cost: str,
+    group_id: int,
+    currency_code: str = "INR",
+    date: Optional[str] = None,
+    details: Optional[str] = None,
+    category_id: Optional[int] = None,
+    repeat_interval: str = "never"
+) -> dict:
+    """Build the create_expense body for an expense split equally across a group"""
+    data = {
+        "description": description,
+        "cost": cost,
+        "group_id": group_id,
+        "split_equally": True,
+        "currency_code": currency_code,
+        "repeat_interval": repeat_interval
     }
+    
+    data.update(without_none(date=date, details=details, category_id=category_id))
+    return data
+
+# Last ETag and decoded body per (token, path); a 304 reuses the body with no payload or decode
+etag_cache: OrderedDict[tuple, tuple[str, Any]] = OrderedDict()
+
+async def conditional_get(path: str, headers: dict) -> Any:
+    """GET a Splitwise resource, revalidating a previously seen copy with If-None-Match"""
+    key = (headers["Authorization"], path)
+    cached = etag_cache.get(key)
+    if cached is not None:
+        headers = {**headers, "If-None-Match": cached[0]}
+    response = await http_client.get(path, headers=headers)
+    if response.status_code == 304 and cached is not None:
+        etag_cache.move_to_end(key)
+        return cached[1]
+    result = parse_json(response)
+    etag = response.headers.get("ETag")
+    if etag and response.is_success:
+        etag_cache[key] = (etag, result)
+        etag_cache.move_to_end(key)
+        while len(etag_cache) > RESPONSE_CACHE_SIZE:
+            etag_cache.popitem(last=False)
+    return result
+
+# Currencies and categories are the same for every account and rarely change, so they are
+# cached once per path for all browsers and are not cleared by write tools.
+# Expired entries with an ETag are revalidated, so an unchanged list comes back as an empty 304.
+REFERENCE_CACHE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "86400"))
+reference_cache: Dict[str, tuple[float, Optional[str], Any]] = {}
+# Fetch running per path, so a cold or expired cache sends one request however many callers arrive
+reference_inflight: Dict[str, asyncio.Task] = {}
+
+async def get_reference_data(path: str, headers: dict) -> Any:
+    """GET static Splitwise reference data, serving it from memory for REFERENCE_CACHE_TTL seconds"""
+    entry = reference_cache.get(path)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[2]
+    waited = None
+    while (task := reference_inflight.get(path)) is not None and task is not waited:
+        waited = task
+        try:
+            await asyncio.shield(task)
+        except Exception:
+            pass
+        entry = reference_cache.get(path)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[2]
+        # The shared fetch failed, possibly because of the other caller's token; retry with ours
+    task = asyncio.ensure_future(fetch_reference_data(path, headers))
+    reference_inflight[path] = task
+    task.add_done_callback(lambda done: reference_inflight.pop(path) if reference_inflight.get(path) is done else None)
+    return await asyncio.shield(task)
+
+async def fetch_reference_data(path: str, headers: dict) -> Any:
+    """Fetch reference data from Splitwise, revalidating the cached copy if there is one"""
+    entry = reference_cache.get(path)
+    if entry is not None and entry[1]:
+        headers = {**headers, "If-None-Match": entry[1]}
+    response = await http_client.get(path, headers=headers)
+    if response.status_code == 304 and entry is not None:
+        reference_cache[path] = (time.monotonic() + REFERENCE_CACHE_TTL, entry[1], entry[2])
+        return entry[2]
+    result = parse_json(response)
+    if response.is_success and REFERENCE_CACHE_TTL > 0:
+        reference_cache[path] = (time.monotonic() + REFERENCE_CACHE_TTL, response.headers.get("ETag"), result)
+    return result
+
+# Notifications already seen per access token: {"cursor": newest created_at, "items": {id: notification}}.
+# Polls without updated_after only ask Splitwise for what is newer than the cursor.
+NOTIFICATIONS_KEPT = 200
+notification_state: OrderedDict[str, dict] = OrderedDict()
 
-def validate_browser_id(browser_id: str) -> dict:
+# create_friends fans out to create_friend for lists up to this size
+CREATE_FRIENDS_FAN_OUT_MAX = 10
+CREATE_FRIENDS_CONCURRENCY = 8
+# Maximum get_comments calls in flight for one get_expenses_comments call
+GET_COMMENTS_CONCURRENCY = 10
+# Maximum create_expense calls in flight for one create_expenses_equal_split call
+CREATE_EXPENSES_CONCURRENCY = 8
+
+def without_none(**fields) -> dict:
+    """Keep only the optional fields the caller actually provided"""
+    return {key: value for key, value in fields.items() if value is not None}
+
+# Tokens are per user so auth can't live on the client, but each user's headers are
+# built once and reused. As an httpx.Headers they are already normalized, so httpx copies
+# them per request instead of re-validating every name and value. They are shared: copy
+# before adding headers.
+@functools.lru_cache(maxsize=1024)
+def get_headers(access_token: str) -> httpx.Headers:
+    return httpx.Headers({
+        "Authorization": f"Bearer {access_token}",
+        # Request bodies are pre-encoded with orjson and sent as raw content
+        "Content-Type": "application/json"
+    })
+
+def parse_json(response: httpx.Response) -> Any:
+    """Decode a response body with orjson, which is several times faster than the stdlib json module.
+    
+    Non-2xx responses become the same fail dict the tools already return. Only JSON error
+    bodies (Splitwise's {"errors": ...}) are decoded; HTML error pages are never parsed.
+    """
+    if response.is_success:
+        return orjson.loads(response.content)
+    error = {"status": "fail", "error": f"Splitwise API returned HTTP {response.status_code}"}
+    if response.headers.get("content-type", "").startswith("application/json") and response.content:
+        error["details"] = orjson.loads(response.content)
+    return error
+
+async def splitwise_call(method: str, path: str, headers: dict, params: Optional[dict] = None,
+                         data: Optional[dict] = None, idempotent: bool = False) -> Any:
+    """Send a request to the Splitwise API and return the decoded response.
+    
+    Pass idempotent=True for writes that are safe to repeat so transient failures are retried.
+    """
+    content = orjson.dumps(data) if data is not None else None
+    response = await http_client.request(method, path, headers=headers, params=params, content=content,
+                                         extensions={"idempotent": idempotent})
+    return parse_json(response)
+
+# Writes sent with wait=False; holding the tasks keeps them alive and lets shutdown wait for them
+background_writes: set[asyncio.Task] = set()
+
+def splitwise_call_in_background(method: str, path: str, headers: dict, idempotent: bool = False) -> None:
+    """Send a write without waiting for Splitwise; failures are logged rather than returned"""
+    async def run():
+        try:
+            result = await splitwise_call(method, path, headers, idempotent=idempotent)
+            if result.get("status") == "fail" or result.get("errors") or result.get("success") is False:
+                logger.warning("Background %s %s failed: %s", method, path, result)
+        except Exception:
+            logger.exception("Background %s %s failed", method, path)
+        finally:
+            # Reads made while the write was in flight may be stale
+            invalidate_response_cache()
+    
+    task = asyncio.ensure_future(run())
+    background_writes.add(task)
+    task.add_done_callback(background_writes.discard)
+
+async def validate_browser_id(browser_id: str) -> dict:
     """Validate that a browser_id is provided and check for access token and splitwise_user_id in database.
     Args:
         browser_id: The browser ID to validate
     Returns:
         dict: Status with splitwise_user_id and access token if found, or error message with login URL
     """
-    user_data = db.get_user_token_and_splitwise_id(browser_id)
+    user_data = await get_db().get_user_token_and_splitwise_id(browser_id)
     if user_data is None:
-        auth_url = f"https://secure.splitwise.com/oauth/authorize?client_id={os.getenv('SPLITWISE_CONSUMER_KEY')}&response_type=code&redirect_uri={os.getenv('REDIRECT_URI')}&state={browser_id}"
-        print(auth_url)
+        auth_url = auth_url_prefix + browser_id
+        logger.debug("Login required for browser_id=%s: %s", browser_id, auth_url)
         return {
             "status": "fail",
             "error": f"User {browser_id} authentication expired. Please login to Splitwise and provide your access token again. After logging in, say 'try again' to repeat your last action. Please show this url to user.",
@@ -60,27 +440,28 @@ def validate_browser_id(browser_id: str) -> dict:
 
 # User endpoints
 @mcp.tool
-def get_current_user(browser_id: str) -> dict:
+@cached_tool()
+async def get_current_user(browser_id: str) -> dict:
     """Retrieve detailed information about the currently authenticated user's profile."""
-    caller_details = validate_browser_id(browser_id)
+    caller_details = await validate_browser_id(browser_id)
     if caller_details["status"] == "fail":
         return caller_details
     headers = get_headers(caller_details["access_token"])
-    response = requests.get(f"{base_url}/get_current_user", headers=headers)
-    return response.json()
+    return await conditional_get("/get_current_user", headers)
 
 @mcp.tool
-def get_user(browser_id: str, target_user_id: int) -> dict:
+@cached_tool()
+async def get_user(browser_id: str, target_user_id: int) -> dict:
     """Retrieve public profile information about another Splitwise user by their ID."""
-    caller_details = validate_browser_id(browser_id)
+    caller_details = await validate_browser_id(browser_id)
     if caller_details["status"] == "fail":
         return caller_details
     headers = get_headers(caller_details["access_token"])
-    response = requests.get(f"{base_url}/get_user/{target_user_id}", headers=headers)
-    return response.json()
+    return await conditional_get(f"/get_user/{target_user_id}", headers)
 
 @mcp.tool
-def update_user(
+@invalidates_cache
+async def update_user(
     browser_id: str,
     first_name: Optional[str] = None,
     last_name: Optional[str] = None,
@@ -115,29 +496,24 @@ def update_user(
         - Change default currency: update_user("user123", default_currency="USD")
         - Update multiple fields: update_user("user123", first_name="Jane", email="jane@example.com", default_currency="EUR")
     """
-    caller_details = validate_browser_id(browser_id)
+    caller_details = await validate_browser_id(browser_id)
     if caller_details["status"] == "fail":
         return caller_details
     headers = get_headers(caller_details["access_token"])
     splitwise_user_id = caller_details["splitwise_user_id"]
-    data = {}
-    if first_name is not None:
-        data['first_name'] = first_name
-    if last_name is not None:
-        data['last_name'] = last_name
-    if email is not None:
-        data['email'] = email
-    if password is not None:
-        data['password'] = password
-    if locale is not None:
-        data['locale'] = locale
-    if default_currency is not None:
-        data['default_currency'] = default_currency
-    response = requests.post(f"{base_url}/update_user/{splitwise_user_id}", headers=headers, json=data)
-    return response.json()
+    data = without_none(
+        first_name=first_name,
+        last_name=last_name,
+        email=email,
+        password=password,
+        locale=locale,
+        default_currency=default_currency
+    )
+    return await splitwise_call("POST", f"/update_user/{splitwise_user_id}", headers, data=data)
 
 @mcp.tool
-def logout(browser_id: str) -> dict:
+@invalidates_cache
+async def logout(browser_id: str) -> dict:
     """Logout the current user by removing their access token from the database.
     
     This tool securely logs out a user by deleting their Splitwise access token from the local database.
@@ -157,14 +533,14 @@ def logout(browser_id: str) -> dict:
     """
     try:
         # Check if user exists in database
-        if not db.user_exists(browser_id):
+        if not await get_db().user_exists(browser_id):
             return {
                 "status": "fail",
                 "error": f"User {browser_id} is not logged in or doesn't exist in the database."
             }
         
         # Delete the user's token from database
-        success = db.delete_user_token(browser_id)
+        success = await get_db().delete_user_token(browser_id)
         
         if success:
             return {
@@ -177,7 +553,7 @@ def logout(browser_id: str) -> dict:
                 "error": f"Failed to logout user {browser_id}. Please try again."
             }
     except Exception as e:
-        logger.error(f"Error during logout for user {browser_id}: {e}")
+        logger.error("Error during logout for user %s: %s", browser_id, e)
         return {
             "status": "fail",
             "error": f"An error occurred during logout: {str(e)}"
@@ -185,7 +561,8 @@ def logout(browser_id: str) -> dict:
 
 # Group endpoints
 @mcp.tool
-def get_groups(browser_id: str) -> dict:
+@cached_tool()
+async def get_groups(browser_id: str) -> dict:
     """Retrieve all groups that the current user is a member of.
     
     This tool returns a comprehensive list of all groups you belong to, including:
@@ -206,15 +583,15 @@ def get_groups(browser_id: str) -> dict:
         
     Example: Returns groups like "Apartment 2024", "Weekend Trip", "Couple Expenses", etc.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.get(f"{base_url}/get_groups", headers=headers)
-    return response.json()
+    return await conditional_get("/get_groups", headers)
 
 @mcp.tool
-def get_group(browser_id: str, group_id: int) -> dict:
+@cached_tool()
+async def get_group(browser_id: str, group_id: int) -> dict:
     """Get detailed information about a specific group by its ID.
     
     This tool provides comprehensive details about a particular group including:
@@ -233,15 +610,15 @@ def get_group(browser_id: str, group_id: int) -> dict:
         
     Note: You can only access groups where you are a member.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.get(f"{base_url}/get_group/{group_id}", headers=headers)
-    return response.json()
+    return await conditional_get(f"/get_group/{group_id}", headers)
 
 @mcp.tool
-def create_group(
+@invalidates_cache
+async def create_group(
     browser_id: str,
     name: str,
     group_type: str = "other",
@@ -279,7 +656,7 @@ def create_group(
         - Create a roommate group: create_group(123, "Apartment 2024", "home", True)
         - Create a trip group with members: create_group(123, "Weekend Trip", "trip", users=[{"first_name": "Alice", "last_name": "Smith", "email": "alice@example.com"}])
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
@@ -291,15 +668,13 @@ def create_group(
     
     # Add users if provided
     if users:
-        for i, user in enumerate(users):
-            for key, value in user.items():
-                data[f"users__{i}__{key}"] = value
+        add_nested_param(data, "users", users)
     
-    response = requests.post(f"{base_url}/create_group", headers=headers, json=data)
-    return response.json()
+    return await splitwise_call("POST", "/create_group", headers, data=data)
 
 @mcp.tool
-def delete_group(browser_id: str, group_id: int) -> dict:
+@invalidates_cache
+async def delete_group(browser_id: str, group_id: int) -> dict:
     """Permanently delete a group and all associated data.
     
     This action is irreversible and will delete:
@@ -319,15 +694,15 @@ def delete_group(browser_id: str, group_id: int) -> dict:
         
     Warning: This permanently removes all group data and cannot be undone easily.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.post(f"{base_url}/delete_group/{group_id}", headers=headers)
-    return response.json()
+    return await splitwise_call("POST", f"/delete_group/{group_id}", headers)
 
 @mcp.tool
-def undelete_group(browser_id: str, group_id: int) -> dict:
+@invalidates_cache
+async def undelete_group(browser_id: str, group_id: int) -> dict:
     """Restore a previously deleted group and its associated data.
     
     This tool attempts to restore a group that was previously deleted. The success
@@ -342,15 +717,15 @@ def undelete_group(browser_id: str, group_id: int) -> dict:
         
     Note: Restoration may not always be possible depending on how long ago the group was deleted.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.post(f"{base_url}/undelete_group/{group_id}", headers=headers)
-    return response.json()
+    return await splitwise_call("POST", f"/undelete_group/{group_id}", headers)
 
 @mcp.tool
-def add_user_to_group(
+@invalidates_cache
+async def add_user_to_group(
     browser_id: str,
     group_id: int,
     target_user_id: Optional[int] = None,
@@ -383,7 +758,10 @@ def add_user_to_group(
         
     Note: Either target_user_id OR all of first_name, last_name, and email must be provided.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    # Reject malformed calls before touching the database; empty strings count as missing
+    if target_user_id is None and not all((first_name, last_name, email)):
+        raise ValueError("Either target_user_id or all of first_name, last_name, and email must be provided")
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
@@ -392,17 +770,15 @@ def add_user_to_group(
     if target_user_id is not None:
         data["user_id"] = target_user_id
     else:
-        if first_name is None or last_name is None or email is None:
-            raise ValueError("Either target_user_id or all of first_name, last_name, and email must be provided")
         data["first_name"] = first_name
         data["last_name"] = last_name
         data["email"] = email
     
-    response = requests.post(f"{base_url}/add_user_to_group", headers=headers, json=data)
-    return response.json()
+    return await splitwise_call("POST", "/add_user_to_group", headers, data=data)
 
 @mcp.tool
-def remove_user_from_group(browser_id: str, group_id: int, target_user_id: int) -> dict:
+@invalidates_cache
+async def remove_user_from_group(browser_id: str, group_id: int, target_user_id: int) -> dict:
     """Remove a user from a group.
     
     This tool removes a user from a group. The operation will fail if the user
@@ -418,7 +794,7 @@ def remove_user_from_group(browser_id: str, group_id: int, target_user_id: int)
         
     Note: Users with outstanding balances cannot be removed from groups.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
@@ -426,12 +802,12 @@ def remove_user_from_group(browser_id: str, group_id: int, target_user_id: int)
         "group_id": group_id,
         "user_id": target_user_id
     }
-    response = requests.post(f"{base_url}/remove_user_from_group", headers=headers, json=data)
-    return response.json()
+    return await splitwise_call("POST", "/remove_user_from_group", headers, data=data)
 
 # Friend endpoints
 @mcp.tool
-def get_friends(browser_id: str) -> dict:
+@cached_tool()
+async def get_friends(browser_id: str) -> dict:
     """Retrieve all friends of the current user.
     
     This tool returns a list of all your Splitwise friends with detailed information:
@@ -450,15 +826,15 @@ def get_friends(browser_id: str) -> dict:
         
     Example: Returns friends like "Alice Smith", "Bob Johnson" with their current balances.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.get(f"{base_url}/get_friends", headers=headers)
-    return response.json()
+    return await conditional_get("/get_friends", headers)
 
 @mcp.tool
-def get_friend(browser_id: str, friend_id: int) -> dict:
+@cached_tool()
+async def get_friend(browser_id: str, friend_id: int) -> dict:
     """Get detailed information about a specific friend.
     
     This tool provides comprehensive details about a particular friend including:
@@ -476,15 +852,15 @@ def get_friend(browser_id: str, friend_id: int) -> dict:
         
     Note: You can only access information about users who are your friends.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.get(f"{base_url}/get_friend/{friend_id}", headers=headers)
-    return response.json()
+    return await conditional_get(f"/get_friend/{friend_id}", headers)
 
 @mcp.tool
-def create_friend(
+@invalidates_cache
+async def create_friend(
     browser_id: str,
     user_email: str,
     user_first_name: Optional[str] = None,
@@ -513,22 +889,19 @@ def create_friend(
         
     Note: If the user doesn't exist, you must provide both first_name and last_name.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
     data = {"user_email": user_email}
     
-    if user_first_name is not None:
-        data["user_first_name"] = user_first_name
-    if user_last_name is not None:
-        data["user_last_name"] = user_last_name
+    data.update(without_none(user_first_name=user_first_name, user_last_name=user_last_name))
     
-    response = requests.post(f"{base_url}/create_friend", headers=headers, json=data)
-    return response.json()
+    return await splitwise_call("POST", "/create_friend", headers, data=data)
 
 @mcp.tool
-def create_friends(browser_id: str, friends: List[Dict[str, str]]) -> dict:
+@invalidates_cache
+async def create_friends(browser_id: str, friends: List[Dict[str, str]]) -> dict:
     """Add multiple friends to your Splitwise account at once.
     
     This tool allows you to add several friends simultaneously, which is more efficient
@@ -548,21 +921,49 @@ def create_friends(browser_id: str, friends: List[Dict[str, str]]) -> dict:
         - Add multiple existing users: create_friends(123, [{"email": "alice@example.com"}, {"email": "bob@example.com"}])
         - Add new users: create_friends(123, [{"email": "charlie@example.com", "first_name": "Charlie", "last_name": "Brown"}])
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
+    
+    # Small lists go out as concurrent create_friend calls over the pooled connection, which
+    # usually beats one create_friends round trip; larger ones use the bulk endpoint.
+    if len(friends) <= CREATE_FRIENDS_FAN_OUT_MAX:
+        semaphore = asyncio.Semaphore(CREATE_FRIENDS_CONCURRENCY)
+        
+        async def add_friend(friend: Dict[str, str]) -> dict:
+            data = without_none(
+                user_email=friend.get("email"),
+                user_first_name=friend.get("first_name"),
+                user_last_name=friend.get("last_name")
+            )
+            async with semaphore:
+                return await splitwise_call("POST", "/create_friend", headers, data=data)
+        
+        results = await asyncio.gather(*(add_friend(friend) for friend in friends), return_exceptions=True)
+        # Same shape as the create_friends response: created users plus errors keyed by email
+        users, errors = [], {}
+        for friend, result in zip(friends, results):
+            if isinstance(result, Exception):
+                errors[friend.get("email")] = str(result)
+            elif result.get("status") == "fail" or result.get("errors"):
+                errors[friend.get("email")] = result.get("errors") or result
+            elif "friend" in result:
+                users.append(result["friend"])
+            else:
+                # Unexpected response; report it so every input shows up in users or errors
+                errors[friend.get("email")] = result
+        return {"users": users, "errors": errors}
+    
     data = {}
     
-    for i, friend in enumerate(friends):
-        for key, value in friend.items():
-            data[f"friends__{i}__{key}"] = value
+    add_nested_param(data, "friends", friends)
     
-    response = requests.post(f"{base_url}/create_friends", headers=headers, json=data)
-    return response.json()
+    return await splitwise_call("POST", "/create_friends", headers, data=data)
 
 @mcp.tool
-def delete_friend(browser_id: str, friend_id: int) -> dict:
+@invalidates_cache
+async def delete_friend(browser_id: str, friend_id: int) -> dict:
     """Remove a friendship from your Splitwise account.
     
     This tool ends the friendship with another user. This will remove them from your
@@ -577,16 +978,16 @@ def delete_friend(browser_id: str, friend_id: int) -> dict:
         
     Note: This action cannot be undone - you'll need to add them as a friend again if needed.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.post(f"{base_url}/delete_friend/{friend_id}", headers=headers)
-    return response.json()
+    return await splitwise_call("POST", f"/delete_friend/{friend_id}", headers)
 
 # Expense endpoints
 @mcp.tool
-def get_expense(browser_id: str, expense_id: int) -> dict:
+@cached_tool()
+async def get_expense(browser_id: str, expense_id: int) -> dict:
     """Retrieve detailed information about a specific expense.
     
     This tool provides comprehensive details about an expense including:
@@ -605,15 +1006,14 @@ def get_expense(browser_id: str, expense_id: int) -> dict:
         
     Note: You can only access expenses that involve you (you're a member of the group or friend).
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.get(f"{base_url}/get_expense/{expense_id}", headers=headers)
-    return response.json()
+    return await splitwise_call("GET", f"/get_expense/{expense_id}", headers)
 
 @mcp.tool
-def get_expenses(
+async def get_expenses(
     browser_id: str,
     group_id: Optional[int] = None,
     friend_id: Optional[int] = None,
@@ -654,34 +1054,26 @@ def get_expenses(
         
     Note: If both group_id and friend_id are provided, group_id takes precedence.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    params = {}
-    
-    if group_id is not None:
-        params['group_id'] = group_id
-    if friend_id is not None:
-        params['friend_id'] = friend_id
-    if dated_after is not None:
-        params['dated_after'] = dated_after
-    if dated_before is not None:
-        params['dated_before'] = dated_before
-    if updated_after is not None:
-        params['updated_after'] = updated_after
-    if updated_before is not None:
-        params['updated_before'] = updated_before
-    if limit is not None:
-        params['limit'] = limit
-    if offset is not None:
-        params['offset'] = offset
+    params = without_none(
+        group_id=group_id,
+        friend_id=friend_id,
+        dated_after=dated_after,
+        dated_before=dated_before,
+        updated_after=updated_after,
+        updated_before=updated_before,
+        limit=limit,
+        offset=offset
+    )
     
-    response = requests.get(f"{base_url}/get_expenses", headers=headers, params=params)
-    return response.json()
+    return await splitwise_call("GET", "/get_expenses", headers, params=params)
 
 @mcp.tool
-def create_expense_equal_split(
+@invalidates_cache
+async def create_expense_equal_split(
     browser_id: str,
     description: str,
     cost: str,
@@ -718,31 +1110,60 @@ def create_expense_equal_split(
         
     Note: The expense will be split equally among all group members, with you as the payer.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    data = {
-        "description": description,
-        "cost": cost,
-        "group_id": group_id,
-        "split_equally": True,
-        "currency_code": currency_code,
-        "repeat_interval": repeat_interval
-    }
+    data = equal_split_payload(description, cost, group_id, currency_code, date, details, category_id, repeat_interval)
+    return await splitwise_call("POST", "/create_expense", headers, data=data)
+
+@mcp.tool
+@invalidates_cache
+async def create_expenses_equal_split(browser_id: str, expenses: List[Dict[str, Any]]) -> dict:
+    """Create several expenses at once, each split equally among the members of its group.
     
-    if date is not None:
-        data["date"] = date
-    if details is not None:
-        data["details"] = details
-    if category_id is not None:
-        data["category_id"] = category_id
+    Use this instead of calling create_expense_equal_split repeatedly, e.g. when logging all
+    the expenses from a trip. The expenses are created concurrently.
     
-    response = requests.post(f"{base_url}/create_expense", headers=headers, json=data)
-    return response.json()
+    Args:
+        browser_id (str): Your browser ID (required for all tool calls)
+        expenses (list): List of expense dictionaries. Each dict takes the same fields as
+            create_expense_equal_split:
+            - "description", "cost", "group_id" (required)
+            - "currency_code", "date", "details", "category_id", "repeat_interval" (optional)
+            
+    Returns:
+        dict: {"expenses": [...]} with one create_expense result per input, in the same order
+        
+    Example:
+        - create_expenses_equal_split("user123", [{"description": "Taxi", "cost": "20.00", "group_id": 123},
+                                                  {"description": "Lunch", "cost": "45.00", "group_id": 123}])
+        
+    Note: Each expense is created independently; a failure in one doesn't undo the others.
+    """
+    caller_deatils = await validate_browser_id(browser_id)
+    if caller_deatils["status"] == "fail":
+        return caller_deatils
+    headers = get_headers(caller_deatils["access_token"])
+    semaphore = asyncio.Semaphore(CREATE_EXPENSES_CONCURRENCY)
+    
+    async def create(expense: Dict[str, Any]) -> dict:
+        try:
+            data = equal_split_payload(**expense)
+        except TypeError as e:
+            return {"status": "fail", "error": f"Invalid expense: {e}"}
+        async with semaphore:
+            return await splitwise_call("POST", "/create_expense", headers, data=data)
+    
+    results = await asyncio.gather(*(create(expense) for expense in expenses), return_exceptions=True)
+    return {"expenses": [
+        {"status": "fail", "error": str(result)} if isinstance(result, Exception) else result
+        for result in results
+    ]}
 
 @mcp.tool
-def create_expense_by_shares(
+@invalidates_cache
+async def create_expense_by_shares(
     browser_id: str,
     description: str,
     cost: str,
@@ -789,7 +1210,7 @@ def create_expense_by_shares(
         
     Note: The sum of paid_shares should equal the total cost, and the sum of owed_shares should equal the total cost.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
@@ -801,23 +1222,16 @@ def create_expense_by_shares(
         "repeat_interval": repeat_interval
     }
     
-    if date is not None:
-        data["date"] = date
-    if details is not None:
-        data["details"] = details
-    if category_id is not None:
-        data["category_id"] = category_id
+    data.update(without_none(date=date, details=details, category_id=category_id))
     
     # Add user shares
-    for i, user in enumerate(users):
-        for key, value in user.items():
-            data[f"users__{i}__{key}"] = value
+    add_nested_param(data, "users", users)
     
-    response = requests.post(f"{base_url}/create_expense", headers=headers, json=data)
-    return response.json()
+    return await splitwise_call("POST", "/create_expense", headers, data=data)
 
 @mcp.tool
-def update_expense(
+@invalidates_cache
+async def update_expense(
     browser_id: str,
     expense_id: int,
     description: Optional[str] = None,
@@ -863,40 +1277,30 @@ def update_expense(
         
     Note: Only provide the parameters you want to change. If you provide users, all existing shares will be replaced.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    data = {}
-    
-    if description is not None:
-        data["description"] = description
-    if cost is not None:
-        data["cost"] = cost
-    if group_id is not None:
-        data["group_id"] = group_id
-    if currency_code is not None:
-        data["currency_code"] = currency_code
-    if date is not None:
-        data["date"] = date
-    if details is not None:
-        data["details"] = details
-    if category_id is not None:
-        data["category_id"] = category_id
-    if repeat_interval is not None:
-        data["repeat_interval"] = repeat_interval
+    data = without_none(
+        description=description,
+        cost=cost,
+        group_id=group_id,
+        currency_code=currency_code,
+        date=date,
+        details=details,
+        category_id=category_id,
+        repeat_interval=repeat_interval
+    )
     
     # Add user shares if provided
     if users is not None:
-        for i, user in enumerate(users):
-            for key, value in user.items():
-                data[f"users__{i}__{key}"] = value
+        add_nested_param(data, "users", users)
     
-    response = requests.post(f"{base_url}/update_expense/{expense_id}", headers=headers, json=data)
-    return response.json()
+    return await splitwise_call("POST", f"/update_expense/{expense_id}", headers, data=data)
 
 @mcp.tool
-def delete_expense(browser_id: str, expense_id: int) -> dict:
+@invalidates_cache
+async def delete_expense(browser_id: str, expense_id: int, wait: bool = True) -> dict:
     """Delete an expense from your Splitwise account.
     
     This tool removes an expense and all its associated data including:
@@ -911,21 +1315,27 @@ def delete_expense(browser_id: str, expense_id: int) -> dict:
     Args:
         browser_id (str): Your browser ID (required for all tool calls)
         expense_id (int): The unique identifier of the expense to delete
+        wait (bool, optional): Wait for Splitwise to confirm the deletion (default: True).
+            Set to False to return {"status": "accepted"} immediately; failures are then only logged.
         
     Returns:
         dict: Success status and any error messages from the deletion
         
     Note: This action can be undone using the undelete_expense tool.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.post(f"{base_url}/delete_expense/{expense_id}", headers=headers)
-    return response.json()
+    if not wait:
+        splitwise_call_in_background("POST", f"/delete_expense/{expense_id}", headers, idempotent=True)
+        return {"status": "accepted", "expense_id": expense_id}
+    # Deleting or restoring the same expense twice has no further effect, so it is safe to retry
+    return await splitwise_call("POST", f"/delete_expense/{expense_id}", headers, idempotent=True)
 
 @mcp.tool
-def undelete_expense(browser_id: str, expense_id: int) -> dict:
+@invalidates_cache
+async def undelete_expense(browser_id: str, expense_id: int, wait: bool = True) -> dict:
     """Restore a previously deleted expense.
     
     This tool attempts to restore an expense that was previously deleted. The success
@@ -934,22 +1344,27 @@ def undelete_expense(browser_id: str, expense_id: int) -> dict:
     Args:
         browser_id (str): Your browser ID (required for all tool calls)
         expense_id (int): The unique identifier of the deleted expense to restore
+        wait (bool, optional): Wait for Splitwise to confirm the restoration (default: True).
+            Set to False to return {"status": "accepted"} immediately; failures are then only logged.
         
     Returns:
         dict: Success status and any error messages from the restoration attempt
         
     Note: Restoration may not always be possible depending on how long ago the expense was deleted.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.post(f"{base_url}/undelete_expense/{expense_id}", headers=headers)
-    return response.json()
+    if not wait:
+        splitwise_call_in_background("POST", f"/undelete_expense/{expense_id}", headers, idempotent=True)
+        return {"status": "accepted", "expense_id": expense_id}
+    # Deleting or restoring the same expense twice has no further effect, so it is safe to retry
+    return await splitwise_call("POST", f"/undelete_expense/{expense_id}", headers, idempotent=True)
 
 # Comment endpoints
 @mcp.tool
-def get_comments(browser_id: str, expense_id: int) -> dict:
+async def get_comments(browser_id: str, expense_id: int) -> dict:
     """Retrieve all comments for a specific expense.
     
     This tool returns all comments associated with an expense, including:
@@ -968,16 +1383,52 @@ def get_comments(browser_id: str, expense_id: int) -> dict:
         
     Note: You can only access comments for expenses that involve you.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
     params = {'expense_id': expense_id}
-    response = requests.get(f"{base_url}/get_comments", headers=headers, params=params)
-    return response.json()
+    return await splitwise_call("GET", "/get_comments", headers, params=params)
 
 @mcp.tool
-def create_comment(browser_id: str, expense_id: int, content: str) -> dict:
+async def get_expenses_comments(browser_id: str, expense_ids: List[int]) -> dict:
+    """Retrieve the comments for several expenses at once.
+    
+    Use this instead of calling get_comments once per expense, e.g. after listing a page of
+    expenses. The comments for all expenses are fetched concurrently.
+    
+    Args:
+        browser_id (str): Your browser ID (required for all tool calls)
+        expense_ids (List[int]): The unique identifiers of the expenses to get comments for
+        
+    Returns:
+        dict: {"comments": {expense_id: get_comments result}} with one entry per expense
+        
+    Example:
+        - get_expenses_comments("user123", [101, 102, 103])
+    """
+    caller_deatils = await validate_browser_id(browser_id)
+    if caller_deatils["status"] == "fail":
+        return caller_deatils
+    headers = get_headers(caller_deatils["access_token"])
+    expense_ids = list(dict.fromkeys(expense_ids))
+    semaphore = asyncio.Semaphore(GET_COMMENTS_CONCURRENCY)
+    
+    async def fetch(expense_id: int) -> dict:
+        async with semaphore:
+            return await splitwise_call("GET", "/get_comments", headers, params={'expense_id': expense_id})
+    
+    results = await asyncio.gather(*(fetch(expense_id) for expense_id in expense_ids), return_exceptions=True)
+    comments = {}
+    for expense_id, result in zip(expense_ids, results):
+        if isinstance(result, Exception):
+            result = {"status": "fail", "error": str(result)}
+        comments[str(expense_id)] = result
+    return {"comments": comments}
+
+@mcp.tool
+@invalidates_cache
+async def create_comment(browser_id: str, expense_id: int, content: str) -> dict:
     """Add a comment to an expense for discussion or clarification.
     
     This tool allows you to add a comment to an expense to discuss details,
@@ -1000,7 +1451,7 @@ def create_comment(browser_id: str, expense_id: int, content: str) -> dict:
         
     Note: Comments are visible to all users involved in the expense.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
@@ -1008,11 +1459,11 @@ def create_comment(browser_id: str, expense_id: int, content: str) -> dict:
         "expense_id": expense_id,
         "content": content
     }
-    response = requests.post(f"{base_url}/create_comment", headers=headers, json=data)
-    return response.json()
+    return await splitwise_call("POST", "/create_comment", headers, data=data)
 
 @mcp.tool
-def delete_comment(browser_id: str, comment_id: int) -> dict:
+@invalidates_cache
+async def delete_comment(browser_id: str, comment_id: int, wait: bool = True) -> dict:
     """Delete a comment from an expense.
     
     This tool removes a comment that you previously added to an expense.
@@ -1021,25 +1472,31 @@ def delete_comment(browser_id: str, comment_id: int) -> dict:
     Args:
         browser_id (str): Your browser ID (required for all tool calls)
         comment_id (int): The unique identifier of the comment to delete
+        wait (bool, optional): Wait for Splitwise to confirm the deletion (default: True).
+            Set to False to return {"status": "accepted"} immediately; failures are then only logged.
         
     Returns:
         dict: Deleted comment information
         
     Note: You can only delete comments that you created. Comments by other users cannot be deleted.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.post(f"{base_url}/delete_comment/{comment_id}", headers=headers)
-    return response.json()
+    if not wait:
+        splitwise_call_in_background("POST", f"/delete_comment/{comment_id}", headers)
+        return {"status": "accepted", "comment_id": comment_id}
+    return await splitwise_call("POST", f"/delete_comment/{comment_id}", headers)
 
 # Notification endpoints
 @mcp.tool
-def get_notifications(
+@cached_tool(bypass="refresh")
+async def get_notifications(
     browser_id: str,
     updated_after: Optional[str] = None,
-    limit: Optional[int] = None
+    limit: Optional[int] = None,
+    refresh: bool = False
 ) -> dict:
     """Retrieve recent activity notifications for your Splitwise account.
     
@@ -1067,7 +1524,8 @@ def get_notifications(
     Args:
         browser_id (str): Your browser ID (required for all tool calls)
         updated_after (str, optional): Filter notifications updated after this date (ISO format: "2024-01-01T00:00:00Z")
-        limit (int, optional): Maximum number of notifications to return (0 for maximum)
+        limit (int, optional): Maximum number of notifications to return (default: 200, 0 for maximum)
+        refresh (bool, optional): Refetch the full list instead of only what changed since the last call (default: False)
         
     Returns:
         dict: List of recent notifications with activity details and timestamps
@@ -1079,23 +1537,42 @@ def get_notifications(
         
     Note: The content field contains HTML-formatted text suitable for display.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    params = {}
-    
     if updated_after is not None:
-        params['updated_after'] = updated_after
-    if limit is not None:
-        params['limit'] = limit
+        params = without_none(updated_after=updated_after, limit=NOTIFICATIONS_KEPT if limit is None else limit)
+        return await splitwise_call("GET", "/get_notifications", headers, params=params)
+    
+    # Repeat polls only fetch notifications newer than those already held for this token
+    # The held state is only replaced after a successful merge, so a failed poll keeps it
+    key = caller_deatils["access_token"]
+    state = None if refresh else notification_state.get(key)
+    if state is None:
+        state = {"cursor": None, "items": {}}
+    # Never ask for more than is kept, even when the cursor is old and the delta is large
+    params = without_none(updated_after=state["cursor"], limit=NOTIFICATIONS_KEPT)
+    result = await splitwise_call("GET", "/get_notifications", headers, params=params)
+    if "notifications" not in result:
+        return result
+    
+    items = {**state["items"], **{notification["id"]: notification for notification in result["notifications"]}}
+    notifications = sorted(items.values(), key=lambda n: n.get("created_at") or "", reverse=True)
+    del notifications[NOTIFICATIONS_KEPT:]
+    notification_state[key] = {
+        "cursor": notifications[0].get("created_at") if notifications else state["cursor"],
+        "items": {notification["id"]: notification for notification in notifications},
+    }
+    notification_state.move_to_end(key)
+    while len(notification_state) > RESPONSE_CACHE_SIZE:
+        notification_state.popitem(last=False)
     
-    response = requests.get(f"{base_url}/get_notifications", headers=headers, params=params)
-    return response.json()
+    return {**result, "notifications": notifications[:limit] if limit else notifications}
 
 # Other endpoints
 @mcp.tool
-def get_currencies(browser_id: str) -> dict:
+async def get_currencies(browser_id: str) -> dict:
     """Retrieve all supported currencies for expenses.
     
     This tool returns a comprehensive list of all currencies supported by Splitwise,
@@ -1113,15 +1590,14 @@ def get_currencies(browser_id: str) -> dict:
         
     Example: Returns currencies like USD ($), EUR (€), INR (₹), GBP (£), etc.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.get(f"{base_url}/get_currencies", headers=headers)
-    return response.json()
+    return await get_reference_data("/get_currencies", headers)
 
 @mcp.tool
-def get_categories(browser_id: str) -> dict:
+async def get_categories(browser_id: str) -> dict:
     """Retrieve all supported expense categories for organizing expenses.
     
     This tool returns a hierarchical list of all expense categories supported by Splitwise.
@@ -1144,16 +1620,178 @@ def get_categories(browser_id: str) -> dict:
         
     Example: Returns categories like Food & Drink > Groceries, Transportation > Gas, etc.
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
+    if caller_deatils["status"] == "fail":
+        return caller_deatils
+    headers = get_headers(caller_deatils["access_token"])
+    return await get_reference_data("/get_categories", headers)
+
+@mcp.tool
+async def get_currency(browser_id: str, currency_code: str) -> dict:
+    """Look up a single supported currency by its code.
+    
+    Use this instead of get_currencies when you only need to check one currency,
+    e.g. to confirm a code is supported or to get its symbol.
+    
+    Args:
+        browser_id (str): Your browser ID (required for all tool calls)
+        currency_code (str): The currency code to look up (e.g., "USD", "INR")
+    
+    Returns:
+        dict: The currency with its code and symbol, or an error if it isn't supported
+        
+    Example: get_currency("user123", "EUR") returns {"currency": {"currency_code": "EUR", "unit": "€"}}
+    """
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils
     headers = get_headers(caller_deatils["access_token"])
-    response = requests.get(f"{base_url}/get_categories", headers=headers)
-    return response.json()
+    result = await get_reference_data("/get_currencies", headers)
+    if "currencies" not in result:
+        return result
+    code = currency_code.strip().upper()
+    for currency in result["currencies"]:
+        if currency.get("currency_code") == code:
+            return {"currency": currency}
+    return {"status": "fail", "error": f"Unsupported currency code: {currency_code}"}
+
+@mcp.tool
+async def get_category(browser_id: str, category_id: int) -> dict:
+    """Look up a single expense category or subcategory by its ID.
+    
+    Use this instead of get_categories when you only need one category, e.g. to check
+    a category ID before creating an expense.
+    
+    Args:
+        browser_id (str): Your browser ID (required for all tool calls)
+        category_id (int): The unique identifier of the category or subcategory
+    
+    Returns:
+        dict: The category, plus its parent category's ID and name if it is a subcategory
+        
+    Example: get_category("user123", 12) returns the "Groceries" subcategory under "Food and drink"
+    """
+    caller_deatils = await validate_browser_id(browser_id)
+    if caller_deatils["status"] == "fail":
+        return caller_deatils
+    headers = get_headers(caller_deatils["access_token"])
+    result = await get_reference_data("/get_categories", headers)
+    if "categories" not in result:
+        return result
+    for parent in result["categories"]:
+        if parent.get("id") == category_id:
+            return {"category": parent}
+        for subcategory in parent.get("subcategories") or ():
+            if subcategory.get("id") == category_id:
+                return {"category": subcategory, "parent": {"id": parent.get("id"), "name": parent.get("name")}}
+    return {"status": "fail", "error": f"Unknown category ID: {category_id}"}
+
+# Batch endpoint
+@mcp.tool
+@cached_tool()
+async def get_dashboard(browser_id: str) -> dict:
+    """Retrieve your profile, groups and friends together in one call.
+    
+    Use this at the start of a conversation or whenever you need more than one of these,
+    instead of calling get_current_user, get_groups and get_friends separately.
+    The three lookups run concurrently.
+    
+    Args:
+        browser_id (str): Your browser ID (required for all tool calls)
+    
+    Returns:
+        dict: {"user": ..., "groups": [...], "friends": [...]}, plus "errors" keyed by
+        section if any of the lookups failed
+    """
+    caller_deatils = await validate_browser_id(browser_id)
+    if caller_deatils["status"] == "fail":
+        return caller_deatils
+    headers = get_headers(caller_deatils["access_token"])
+    sections = ("user", "groups", "friends")
+    results = await asyncio.gather(
+        conditional_get("/get_current_user", headers),
+        conditional_get("/get_groups", headers),
+        conditional_get("/get_friends", headers),
+        return_exceptions=True
+    )
+    dashboard, errors = {}, {}
+    for section, result in zip(sections, results):
+        if isinstance(result, Exception):
+            errors[section] = str(result)
+        elif result.get("status") == "fail" or section not in result:
+            errors[section] = result
+        else:
+            dashboard[section] = result[section]
+    if errors:
+        dashboard["errors"] = errors
+    return dashboard
+
+@mcp.tool
+async def batch_execute(
+    browser_id: str,
+    operations: List[Dict[str, Any]],
+    max_concurrency: int = 5,
+    stop_on_error: bool = False
+) -> dict:
+    """Run several tool calls in a single request and return all of their results together.
+    
+    Use this instead of calling tools one by one when you need several independent pieces of data,
+    e.g. the details of multiple groups or expenses. Operations run concurrently.
+    
+    Args:
+        browser_id (str): Your browser ID (required for all tool calls)
+        operations (List[Dict[str, Any]]): Calls to make, each as {"op": tool name, "args": {...}}.
+            Leave browser_id out of "args"; it is filled in for every operation.
+        max_concurrency (int, optional): Maximum number of operations running at once (default: 5)
+        stop_on_error (bool, optional): Skip operations that haven't started once one fails (default: False)
+        
+    Returns:
+        dict: {"results": [...]} with one entry per operation, in the same order as the input
+        
+    Example:
+        - batch_execute("user123", [{"op": "get_group", "args": {"group_id": 1}},
+                                    {"op": "get_expenses", "args": {"group_id": 1, "limit": 5}}])
+    """
+    caller_deatils = await validate_browser_id(browser_id)
+    if caller_deatils["status"] == "fail":
+        return caller_deatils
+    tools = await mcp.get_tools()
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    failed = False
+    
+    async def run(index: int, operation: Dict[str, Any]) -> dict:
+        nonlocal failed
+        name = operation.get("op")
+        tool = tools.get(name)
+        if tool is None or name == "batch_execute":
+            result = {"status": "fail", "error": f"Unknown operation: {name}"}
+        else:
+            async with semaphore:
+                if failed and stop_on_error:
+                    return {"index": index, "op": name, "result": {"status": "skipped"}}
+                try:
+                    # Go through tool.run so arguments are validated like a direct tool call
+                    tool_result = await tool.run({**(operation.get("args") or {}), "browser_id": browser_id})
+                    result = tool_result.structured_content
+                    if result is None:
+                        result = "".join(getattr(block, "text", "") for block in tool_result.content)
+                    elif (tool.output_schema or {}).get("x-fastmcp-wrap-result"):
+                        result = result["result"]
+                except ValidationError as e:
+                    result = {"status": "fail", "error": f"Invalid arguments for {name}: {e}"}
+                except Exception as e:
+                    logger.exception("batch_execute operation %s failed", name)
+                    result = {"status": "fail", "error": str(e)}
+        if isinstance(result, dict) and result.get("status") == "fail":
+            failed = True
+        return {"index": index, "op": name, "result": result}
+    
+    results = await asyncio.gather(*(run(i, op) for i, op in enumerate(operations)))
+    return {"results": results}
 
 # Legacy tool for backward compatibility
 @mcp.tool
-def greet(browser_id: str, name: str) -> str:
+async def greet(browser_id: str, name: str) -> str:
     """Simple greeting tool for testing the MCP server connection.
     
     This is a legacy tool maintained for backward compatibility and testing purposes.
@@ -1165,11 +1803,23 @@ def greet(browser_id: str, name: str) -> str:
     Returns:
         str: Greeting message
     """
-    caller_deatils = validate_browser_id(browser_id)
+    caller_deatils = await validate_browser_id(browser_id)
     if caller_deatils["status"] == "fail":
         return caller_deatils["error"]
     return f"Hello, {name}!"
 
+# Page shown in the OAuth popup once the token is saved; encoded once rather than per login
+LOGIN_SUCCESS_HTML = b"""
+<html>
+<body>
+    <script>
+        window.close();
+    </script>
+    <p>Authentication successful! You can close this window.</p>
+</body>
+</html>
+"""
+
 @mcp.custom_route("/callback", methods=["GET"])
 async def callback(request: Request) -> Response:
     logger.info("OAuth callback endpoint called")
@@ -1177,42 +1827,35 @@ async def callback(request: Request) -> Response:
     browser_id = request.query_params.get("state")
     data = {
         "grant_type": "authorization_code",
-        "client_id": os.getenv("SPLITWISE_CONSUMER_KEY"),
-        "client_secret": os.getenv("SPLITWISE_CONSUMER_SECRET"),
-        "redirect_uri": os.getenv("REDIRECT_URI"),
+        "client_id": consumer_key,
+        "client_secret": consumer_secret,
+        "redirect_uri": redirect_uri,
         "code": code
     }
     try:
-        resp = requests.post("https://secure.splitwise.com/oauth/token", data=data)
-        tokens = resp.json()
-        logger.info(f"Token exchange response: {tokens}")
+        resp = await http_client.post(token_url, data=data)
+        tokens = parse_json(resp)
+        # The response carries the access token itself, so only failures are logged in full
+        if "access_token" in tokens:
+            logger.info("Token exchange succeeded for browser_id=%s", browser_id)
+        else:
+            logger.warning("Token exchange failed for browser_id=%s: %s", browser_id, tokens)
         splitwise_user_id = None
         if browser_id is not None and "access_token" in tokens:
             headers = {
                 "Authorization": f"Bearer {tokens['access_token']}"
             }
-            user_resp = requests.get("https://secure.splitwise.com/api/v3.0/get_current_user", headers=headers)
-            user_json = user_resp.json()
-            logger.info(f"Fetched user info: {user_json}")
+            user_resp = await http_client.get("/get_current_user", headers=headers)
+            user_json = parse_json(user_resp)
+            logger.debug("Fetched user info: %s", user_json)
             splitwise_user_id = user_json["user"]["id"]
         if "access_token" in tokens and browser_id is not None and splitwise_user_id is not None:
             try:
-                db.save_user_token(browser_id, splitwise_user_id, tokens["access_token"])
-                logger.info(f"Token saved for browser_id={browser_id}, splitwise_user_id={splitwise_user_id}")
-                from fastapi.responses import HTMLResponse
-                html_content = """
-                <html>
-                <body>
-                    <script>
-                        window.close();
-                    </script>
-                    <p>Authentication successful! You can close this window.</p>
-                </body>
-                </html>
-                """
-                return HTMLResponse(content=html_content)
+                await get_db().save_user_token(browser_id, splitwise_user_id, tokens["access_token"])
+                logger.info("Token saved for browser_id=%s, splitwise_user_id=%s", browser_id, splitwise_user_id)
+                return HTMLResponse(content=LOGIN_SUCCESS_HTML)
             except Exception as e:
-                logger.error(f"Failed to save token: {e}")
+                logger.error("Failed to save token: %s", e)
                 return JSONResponse({"status": "fail", "error": f"Failed to save token: {e}"})
         else:
             logger.error("Failed to get access token or missing user ID")
@@ -1224,11 +1867,37 @@ async def callback(request: Request) -> Response:
 async def health(request: Request) -> Response:
     return JSONResponse({"status": "ok", "message": "Splitwise MCP server is healthy."})
     
+async def warm_up():
+    """Open a pooled connection to Splitwise before the first tool call needs one"""
+    try:
+        # Also fills the reference cache if the endpoint answers without a token
+        await get_reference_data("/get_currencies", {})
+    except httpx.HTTPError as e:
+        logger.warning("Splitwise warm-up request failed: %s", e)
+
+async def main():
+    # DNS, TCP and TLS setup happen while the server starts rather than on a user's first call
+    warm_up_task = asyncio.create_task(warm_up())
+    try:
+        await mcp.run_async(
+            transport="http",
+            host="0.0.0.0",
+            port=int(os.getenv("PORT", "80")),
+            path="/mcp",
+            # Debug logging formats every request and response; set LOG_LEVEL=debug when needed
+            log_level=os.getenv("LOG_LEVEL", "info"),
+        )
+    finally:
+        # Shut down on the server's own loop, where the pooled connections live.
+        # The database's connection threads are non-daemon, so it must be closed to exit.
+        warm_up_task.cancel()
+        # Let fire-and-forget writes reach Splitwise before the client closes
+        await asyncio.gather(*background_writes, return_exceptions=True)
+        await http_client.aclose()
+        await get_db().close()
+
 if __name__ == "__main__":
-    mcp.run(
-        transport="http",
-        host="0.0.0.0",
-        port=int(os.getenv("PORT", "80")),
-        path="/mcp",
-        log_level="debug",
-    )
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())